@@ -1,9 +1,10 @@
 # Import python packages
 import streamlit as st
 import numpy as np
-import matplotlib.pyplot as plt
 import pandas as pd
-import plotly.graph_objects as go
+import altair as alt
+
+from build_kernels import GRID_SIG, IS_TO_Y, LM_TO_Y, NX_PASS_THROUGH, make_compute_grid
 
 st.set_page_config(page_title="Mundell-Fleming Simulator", layout="wide")
 
@@ -14,23 +15,19 @@ using a simplified Mundell-Fleming framework (flexible exchange rates, high capi
 """)
 
 
-# --- Sidebar Inputs ---
-st.sidebar.header("Model Assumptions")
-
-tariff_shock = st.sidebar.slider("Tariff Shock (reduction in imports, % of GDP)", 0.0, 5.0, 2.0)
-ad_contraction = st.sidebar.slider("Aggregate Demand Drag (% of GDP)", 0.0, 5.0, 1.0)
-fiscal_response = st.sidebar.selectbox("Fiscal Response (What Does Gov do with Tariff Revenue)", ["Neutral", "Debt Paydown (Contractionary)", "Tax Cut (Mildly Expansionary)"])
-monetary_policy = st.sidebar.selectbox("Monetary Policy Reaction", ["Neutral", "Eases Rates", "Tightens Rates"])
+# --- Sidebar Reference ---
+st.sidebar.header("About the Curves")
 
-st.sidebar.markdown("""The IS curve shows how output (Y) responds to changes in the interest rate (r), assuming goods market equilibrium. It reflects how:
+# static help text, emitted in one sidebar call
+IS_HELP_MD = """The IS curve shows how output (Y) responds to changes in the interest rate (r), assuming goods market equilibrium. It reflects how:
 
 -  Higher interest rates discourage business investment and consumer borrowing (especially for durables).
 
 -  Lower interest rates encourage more borrowing and spending.
 
-A point along the curve represents an equilibrium between output and rates, where Total Demand = Total Output.""")
+A point along the curve represents an equilibrium between output and rates, where Total Demand = Total Output."""
 
-st.sidebar.markdown("""The LM curve shows how the interest rate (r) must adjust to maintain equilibrium in the money market, given a level of output (Y).
+LM_HELP_MD = """The LM curve shows how the interest rate (r) must adjust to maintain equilibrium in the money market, given a level of output (Y).
 
 Key idea:
 
@@ -38,9 +35,9 @@ Key idea:
 
 -  If the money supply is fixed, this higher demand pushes up interest rates to ration money.
 
--  So: More activity → higher interest rates to clear the market.
+-  So: More activity → higher interest rates to clear the market."""
 
-""")
+st.sidebar.markdown(IS_HELP_MD + "\n\n---\n\n" + LM_HELP_MD)
 
 # --- Core Model Setup ---
 # Base values for IS-LM-BP intersections (arbitrary units)
@@ -48,156 +45,252 @@ Y0 = 100
 r0 = 4.0  # base interest rate
 E0 = 1.0  # base exchange rate index
 
-# any shock that affects aggregate demand will shift the IS curve.
-# positive shock to Y from increase in net exports will shift IS curve to the right
-# net exports do not go up exactly by the decline in imports, due to imperfect/suboptimal import substitution
+# policy options; the widgets return the list position, and that integer code
+# indexes every per-option table below (one array per attribute)
+FISCAL_OPTIONS = ["Neutral", "Debt Paydown (Contractionary)", "Tax Cut (Mildly Expansionary)"]
+MONETARY_OPTIONS = ["Neutral", "Eases Rates", "Tightens Rates"]
+
+# IS shift from what the government does with the tariff revenue
+FISCAL_SHIFTS = np.array([0.0, -1.0, 0.5])
+# LM shift from the monetary policy reaction
+LM_SHIFTS = np.array([0.0, 1.0, -1.0])
 
-# Define shock adjustments
-# IS curve shifts
-net_exports_boost = tariff_shock * 0.6  # only partial pass-through to net exports
-fiscal_shift = 0
-if fiscal_response == "Debt Paydown (Contractionary)":
-    fiscal_shift = -1.0
-elif fiscal_response == "Tax Cut (Mildly Expansionary)":
-    fiscal_shift = 0.5
-
-# so better net exports help IS line move right (more output at a given rate)
-# we directly subtract the drop in GDP (ad_contraction) which shifts the IS line to the left
-# the fiscal response (option) says What does the government do with the tariff revenue?
-
-
-IS_shift = net_exports_boost - ad_contraction + fiscal_shift
-
-
-# ok, now, in a world of higher output, 
-# If the central bank doesn’t increase the money supply, 
-# interest rates must rise to ration available liquidity.
-
-
-# Easing (rate cuts, QE): More liquidity → interest rates can be lower at every level of output 
-# → LM shifts down/right.
-
-#Tightening: Less liquidity → interest rates must be higher to ration money → 
-# LM shifts up/left.
-
-# LM curve shift from monetary policy
-LM_shift = 0
-if monetary_policy == "Eases Rates":
-    LM_shift = 1.0
-elif monetary_policy == "Tightens Rates":
-    LM_shift = -1.0
-
-# Compute new equilibrium
-# output is strongly responsive to demand-side shocks, so coefficient is 0.8
-# smaller coefficient for LM than IS because monetary transmission takes time, 
-# and not all sectors respond equally
-
-
-Y_new = Y0 + 0.8 * IS_shift + 0.5 * LM_shift
-r_new = r0 - 0.3 * LM_shift + 0.2 * IS_shift
-E_change = -0.5 * (r0 - r_new) + 0.3 * net_exports_boost  # simplified FX equation
-E_new = E0 + E_change
-
-# --- Display Results ---
-st.subheader("Results")
-col1, col2, col3 = st.columns(3)
-col1.metric("Output (Y)", f"{Y_new:.2f}", delta=f"{Y_new - Y0:+.2f}")
-col2.metric("Interest Rate (r)", f"{r_new:.2f}%", delta=f"{r_new - r0:+.2f}%")
-col3.metric("Exchange Rate (E)", f"{E_new:.2f}", delta=f"{E_new - E0:+.2f}")
-
-
-# --- Dynamic Narrative Summary ---
-st.subheader("Narrative")
-
-description = []
-
-# Tariff effects
-tariff_text = f"A tariff shock of {tariff_shock:.1f}% of GDP boosts net exports by {net_exports_boost:.1f}%, which tends to increase output and support the exchange rate."
-description.append(tariff_text)
-
-# AD drag
-if ad_contraction > 0:
-    ad_text = f"However, higher prices lead to an aggregate demand contraction of {ad_contraction:.1f}% of GDP, offsetting some of the initial boost."
-    description.append(ad_text)
-
-# Fiscal policy
-descriptions_map = {
-    "Debt Paydown (Contractionary)": "The government uses tariff revenue to pay down debt, which is contractionary and further reduces output.",
-    "Tax Cut (Mildly Expansionary)": "The government implements a mild tax cut, providing a partial offset to weaker demand.",
-    "Neutral": "There is no significant fiscal policy change."
-}
-description.append(descriptions_map[fiscal_response])
-
-# Monetary policy
-monetary_map = {
-    "Neutral": "The central bank does not respond, leaving the interest rate relatively unchanged.",
-    "Eases Rates": "The central bank eases monetary policy, lowering interest rates and stimulating output.",
-    "Tightens Rates": "The central bank tightens policy, raising interest rates and reducing output."
-}
-description.append(monetary_map[monetary_policy])
-
-# FX summary
-if E_change > 0:
-    fx_outcome = "On net, the exchange rate is expected to strengthen due to improving net exports and/or higher interest rates."
-elif E_change < 0:
-    fx_outcome = "On net, the exchange rate is expected to weaken due to lower interest rates or weaker domestic demand."
-else:
-    fx_outcome = "The exchange rate is expected to remain broadly stable, as opposing forces balance out."
-description.append(fx_outcome)
-
-st.write(" ".join(description))
-
-# --- Plot IS-LM Curves using Plotly ---
-Y_vals = np.linspace(95, 105, 100)
-IS_curve = r0 - 0.5 * (Y_vals - Y0) + IS_shift
-LM_curve = r0 + 0.7 * (Y_vals - Y0) + LM_shift
-
-fig = go.Figure()
-fig.add_trace(go.Scatter(x=Y_vals, y=IS_curve, mode='lines', name='IS Curve', line=dict(width=3)))
-fig.add_trace(go.Scatter(x=Y_vals, y=LM_curve, mode='lines', name='LM Curve', line=dict(width=3)))
-fig.add_trace(go.Scatter(x=[Y_new], y=[r_new], mode='markers', name='Equilibrium', marker=dict(size=10, color='red')))
-
-fig.update_layout(
-    title="IS-LM Diagram (Flexible Exchange Rates)",
-    xaxis_title="Output (Y)",
-    yaxis_title="Interest Rate (r)",
-    legend=dict(x=0.02, y=0.98),
-    margin=dict(l=40, r=40, t=40, b=40),
-    template="plotly_white",
-    height=500
+FISCAL_NARRATIVE = (
+    "There is no significant fiscal policy change.",
+    "The government uses tariff revenue to pay down debt, which is contractionary and further reduces output.",
+    "The government implements a mild tax cut, providing a partial offset to weaker demand.",
+)
+MONETARY_NARRATIVE = (
+    "The central bank does not respond, leaving the interest rate relatively unchanged.",
+    "The central bank eases monetary policy, lowering interest rates and stimulating output.",
+    "The central bank tightens policy, raising interest rates and reducing output.",
+)
+# indexed by sign(E_change) + 1: weaken, stable, strengthen
+FX_NARRATIVE = (
+    "On net, the exchange rate is expected to weaken due to lower interest rates or weaker domestic demand.",
+    "The exchange rate is expected to remain broadly stable, as opposing forces balance out.",
+    "On net, the exchange rate is expected to strengthen due to improving net exports and/or higher interest rates.",
 )
-st.plotly_chart(fig, use_container_width=True)
 
-# --- Optional Table ---
-st.subheader("Underlying Shocks")
-data = {
-    "Component": ["Tariff Shock (NX Boost)", "AD Contraction", "Fiscal Shift", "Monetary Shift"],
-    "Value (% of GDP or Rate Shift)": [net_exports_boost, -ad_contraction, fiscal_shift, LM_shift]
-}
-df = pd.DataFrame(data)
-st.dataframe(df, use_container_width=True)
+# narrative sentences that carry numbers; AD_TMPL keeps its trailing space so
+# an empty AD sentence drops out of NARRATIVE_TMPL without a double space
+TARIFF_TMPL = "A tariff shock of {:.1f}% of GDP boosts net exports by {:.1f}%, which tends to increase output and support the exchange rate."
+AD_TMPL = "However, higher prices lead to an aggregate demand contraction of {:.1f}% of GDP, offsetting some of the initial boost. "
+NARRATIVE_TMPL = "{tariff} {ad}{fiscal} {monetary} {fx}"
+
+
+# A handful of scalar ops: cheaper to recompute than to pickle through
+# st.cache_data. The fragment keeps the last result in session state instead.
+def compute_equilibrium(tariff_shock, ad_contraction, fiscal_code, mon_code):
+    # any shock that affects aggregate demand will shift the IS curve.
+    # positive shock to Y from increase in net exports will shift IS curve to the right
+    # net exports do not go up exactly by the decline in imports, due to imperfect/suboptimal import substitution
+
+    # Define shock adjustments
+    # IS curve shifts
+    net_exports_boost = tariff_shock * NX_PASS_THROUGH  # only partial pass-through to net exports
+    fiscal_shift = float(FISCAL_SHIFTS[fiscal_code])
+
+    # so better net exports help IS line move right (more output at a given rate)
+    # we directly subtract the drop in GDP (ad_contraction) which shifts the IS line to the left
+    # the fiscal response (option) says What does the government do with the tariff revenue?
+
+    IS_shift = net_exports_boost - ad_contraction + fiscal_shift
+
+    # ok, now, in a world of higher output, 
+    # If the central bank doesn’t increase the money supply, 
+    # interest rates must rise to ration available liquidity.
+
+    # Easing (rate cuts, QE): More liquidity → interest rates can be lower at every level of output 
+    # → LM shifts down/right.
+
+    #Tightening: Less liquidity → interest rates must be higher to ration money → 
+    # LM shifts up/left.
+
+    # LM curve shift from monetary policy
+    LM_shift = float(LM_SHIFTS[mon_code])
+
+    # Compute new equilibrium
+    # output is strongly responsive to demand-side shocks, so coefficient is 0.8
+    # smaller coefficient for LM than IS because monetary transmission takes time, 
+    # and not all sectors respond equally
+
+    Y_new = Y0 + IS_TO_Y * IS_shift + LM_TO_Y * LM_shift
+    r_new = r0 - 0.3 * LM_shift + 0.2 * IS_shift
+    E_change = -0.5 * (r0 - r_new) + 0.3 * net_exports_boost  # simplified FX equation
+    E_new = E0 + E_change
+
+    return net_exports_boost, fiscal_shift, IS_shift, LM_shift, Y_new, r_new, E_change, E_new
+
+
+# Output grid for the IS-LM diagram never changes, so it is built once at import.
+# Both curves are straight lines, so their endpoints describe them exactly and
+# any extra samples would only grow the chart payload.
+# float32 is ample for a chart and halves the columns shipped to the browser
+# (Python-float shifts added later keep the float32 dtype).
+N_CURVE_SAMPLES = 2
+Y_vals = np.linspace(95, 105, N_CURVE_SAMPLES, dtype=np.float32)
+# unshifted curves over that grid, so a rerun only adds the two shifts
+BASE_IS = r0 - 0.5 * (Y_vals - Y0)
+BASE_LM = r0 + 0.7 * (Y_vals - Y0)
+# shared across sessions, so make any accidental in-place update fail loudly
+for _arr in (Y_vals, BASE_IS, BASE_LM):
+    _arr.setflags(write=False)
+
+
+# grid axes match the slider ranges
+TARIFF_GRID = np.linspace(0.0, 5.0, 21)
+AD_GRID = np.linspace(0.0, 5.0, 21)
+
+
+# Sensitivity grid kernel, loaded once per process rather than on every script
+# run, the first time the heatmap toggle is switched on. Prefer the
+# ahead-of-time build (python build_kernels.py) so neither numba nor a compile
+# is needed; without it, JIT the same source eagerly from the signature, cached
+# to disk so later processes skip the compile; without numba either, run that
+# source as plain Python.
+@st.cache_resource
+def grid_kernel():
+    try:
+        from mf_kernels import compute_grid
+    except ImportError:
+        pass
+    else:
+        # the AOT build froze the coefficients it was compiled with; if they no
+        # longer match the source (a stale build), use the fallbacks instead
+        args = (TARIFF_GRID[::10], AD_GRID[::10], float(Y0), FISCAL_SHIFTS[1], LM_SHIFTS[1])
+        if np.allclose(compute_grid(*args), make_compute_grid()(*args)):
+            return compute_grid
+
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return make_compute_grid()
+    return njit(GRID_SIG, parallel=True, cache=True)(make_compute_grid(prange))
+
+
+# The fragment keeps the charts built below in session state and only calls
+# these again when their inputs change, which skips rebuilding the DataFrames
+# and chart objects. st.altair_chart still serializes the stored chart on
+# every rerun.
+def is_lm_chart(IS_shift, LM_shift, Y_new, r_new):
+    # IS and LM curves only depend on the two shifts
+    curves = pd.DataFrame({"Y": Y_vals, "IS Curve": BASE_IS + IS_shift, "LM Curve": BASE_LM + LM_shift})
+    equilibrium = pd.DataFrame({"Y": [Y_new], "r": [r_new]})
+
+    x = alt.X("Y:Q", title="Output (Y)", scale=alt.Scale(zero=False))
+    y = alt.Y("r:Q", title="Interest Rate (r)", scale=alt.Scale(zero=False))
+    lines = alt.Chart(curves).transform_fold(["IS Curve", "LM Curve"], as_=["Curve", "r"]).mark_line(strokeWidth=3).encode(
+        x=x, y=y, color=alt.Color("Curve:N", title=None, legend=alt.Legend(orient="top-left"))
+    )
+    point = alt.Chart(equilibrium).mark_point(filled=True, size=100, color="red", opacity=1).encode(
+        x=x, y=y, tooltip=[alt.Tooltip("Y:Q", format=".2f"), alt.Tooltip("r:Q", format=".2f")]
+    )
+    return (lines + point).properties(title="IS-LM Diagram (Flexible Exchange Rates)", height=500)
+
+
+def sensitivity_heatmap(fiscal_code, mon_code):
+    Y_grid = grid_kernel()(TARIFF_GRID, AD_GRID, float(Y0),
+                           FISCAL_SHIFTS[fiscal_code], LM_SHIFTS[mon_code])
+    tariff_mesh, ad_mesh = np.meshgrid(TARIFF_GRID, AD_GRID, indexing="ij")
+    grid = pd.DataFrame({"Tariff Shock": tariff_mesh.ravel(), "AD Drag": ad_mesh.ravel(), "Output (Y)": Y_grid.ravel()})
+    return alt.Chart(grid).mark_rect().encode(
+        x=alt.X("Tariff Shock:O", title="Tariff Shock (% of GDP)", axis=alt.Axis(format=".2f")),
+        y=alt.Y("AD Drag:O", title="Aggregate Demand Drag (% of GDP)", sort="descending", axis=alt.Axis(format=".2f")),
+        color=alt.Color("Output (Y):Q", scale=alt.Scale(scheme="redblue", domainMid=Y0)),
+        tooltip=["Tariff Shock:Q", "AD Drag:Q", alt.Tooltip("Output (Y):Q", format=".2f")]
+    ).properties(title=f"Output (Y) - Fiscal: {FISCAL_OPTIONS[fiscal_code]}, Monetary: {MONETARY_OPTIONS[mon_code]}", height=500)
+
+
+# Everything that depends on the inputs lives in a fragment, so moving a
+# slider only reruns this block instead of the whole script. Fragments can't
+# write to st.sidebar, which is why the inputs sit in the main area.
+@st.fragment
+def simulator():
+    # --- Model Assumptions ---
+    st.subheader("Model Assumptions")
+    with st.container(border=True):
+        in1, in2, in3, in4 = st.columns(4)
+        tariff_shock = in1.slider("Tariff Shock (reduction in imports, % of GDP)", 0.0, 5.0, 2.0)
+        ad_contraction = in2.slider("Aggregate Demand Drag (% of GDP)", 0.0, 5.0, 1.0)
+        fiscal_code = in3.selectbox("Fiscal Response (What Does Gov do with Tariff Revenue)", range(len(FISCAL_OPTIONS)),
+                                    format_func=FISCAL_OPTIONS.__getitem__)
+        mon_code = in4.selectbox("Monetary Policy Reaction", range(len(MONETARY_OPTIONS)),
+                                 format_func=MONETARY_OPTIONS.__getitem__)
+
+    # reruns that don't move an input (e.g. flipping the heatmap toggle) reuse the
+    # previous equilibrium and IS-LM chart straight from session state
+    eq_key = (tariff_shock, ad_contraction, fiscal_code, mon_code)
+    if st.session_state.get("eq_key") != eq_key:
+        st.session_state["eq_key"] = eq_key
+        st.session_state["eq_out"] = eq_out = compute_equilibrium(*eq_key)
+        # IS_shift, LM_shift, Y_new, r_new
+        st.session_state["chart"] = is_lm_chart(*eq_out[2:6])
+    (net_exports_boost, fiscal_shift, IS_shift, LM_shift,
+     Y_new, r_new, E_change, E_new) = st.session_state["eq_out"]
+
+    # --- Display Results ---
+    st.subheader("Results")
+    # Streamlit matches elements by position between runs, so these same three
+    # metric slots are updated in place. Placeholders kept in session state
+    # would belong to an earlier run and be cleared when this one ends.
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Output (Y)", f"{Y_new:.2f}", delta=f"{Y_new - Y0:+.2f}")
+    col2.metric("Interest Rate (r)", f"{r_new:.2f}%", delta=f"{r_new - r0:+.2f}%")
+    col3.metric("Exchange Rate (E)", f"{E_new:.2f}", delta=f"{E_new - E0:+.2f}")
+
+
+    # --- Dynamic Narrative Summary ---
+    st.subheader("Narrative")
+
+    # tariff effects, AD drag (only when there is one), fiscal and monetary
+    # policy and the FX summary, filled into one template
+    st.write(NARRATIVE_TMPL.format(
+        tariff=TARIFF_TMPL.format(tariff_shock, net_exports_boost),
+        ad=AD_TMPL.format(ad_contraction) if ad_contraction > 0 else "",
+        fiscal=FISCAL_NARRATIVE[fiscal_code],
+        monetary=MONETARY_NARRATIVE[mon_code],
+        fx=FX_NARRATIVE[int(np.sign(E_change)) + 1],
+    ))
+
+    # --- Plot IS-LM Curves using Altair ---
+    st.altair_chart(st.session_state["chart"], use_container_width=True)
+
+    # --- Sensitivity Heatmap ---
+    # a toggle rather than an expander: an expander's body runs even while
+    # collapsed, so every page load would sweep the grid and load its kernel
+    if st.toggle("Show Output Sensitivity to Tariff Shock and AD Drag"):
+        # the sweep covers both slider ranges, so only the policy mix matters
+        heatmap_key = (fiscal_code, mon_code)
+        if st.session_state.get("heatmap_key") != heatmap_key:
+            st.session_state["heatmap_key"] = heatmap_key
+            st.session_state["heatmap"] = sensitivity_heatmap(fiscal_code, mon_code)
+        st.altair_chart(st.session_state["heatmap"], use_container_width=True)
+
+    # --- Optional Table ---
+    st.subheader("Underlying Shocks")
+    # four rows: st.table takes the records as-is, no DataFrame needed
+    st.table([
+        {"Component": "Tariff Shock (NX Boost)", "Value (% of GDP or Rate Shift)": net_exports_boost},
+        {"Component": "AD Contraction", "Value (% of GDP or Rate Shift)": -ad_contraction},
+        {"Component": "Fiscal Shift", "Value (% of GDP or Rate Shift)": fiscal_shift},
+        {"Component": "Monetary Shift", "Value (% of GDP or Rate Shift)": LM_shift},
+    ])
+
+
+simulator()
 
 # --- Coefficient Reference Table ---
+COEFF_ROWS = [
+    {"Coefficient": "0.8 (IS effect on → Y)", "Meaning": "Effect of demand shocks on output (fiscal multiplier)"},
+    {"Coefficient": "0.5 (LM → Y)", "Meaning": "Effect of monetary easing on output"},
+    {"Coefficient": "-0.3 (LM → r)", "Meaning": "Effect of monetary easing on interest rates"},
+    {"Coefficient": "0.2 (IS → r)", "Meaning": "Effect of demand pressure on interest rates"},
+    {"Coefficient": "-0.5 (∆r → ∆E)", "Meaning": "Effect of interest rate changes on exchange rate"},
+    {"Coefficient": "0.3 (NX → ∆E)", "Meaning": "Effect of net export boost on exchange rate"},
+]
+
 with st.expander("Show Model Coefficients and Interpretations"):
-    coeff_data = {
-        "Coefficient": [
-            "0.8 (IS effect on → Y)",
-            "0.5 (LM → Y)",
-            "-0.3 (LM → r)",
-            "0.2 (IS → r)",
-            "-0.5 (∆r → ∆E)",
-            "0.3 (NX → ∆E)"
-        ],
-        "Meaning": [
-            "Effect of demand shocks on output (fiscal multiplier)",
-            "Effect of monetary easing on output",
-            "Effect of monetary easing on interest rates",
-            "Effect of demand pressure on interest rates",
-            "Effect of interest rate changes on exchange rate",
-            "Effect of net export boost on exchange rate"
-        ]
-    }
-    coeff_df = pd.DataFrame(coeff_data)
-    st.dataframe(coeff_df, use_container_width=True)
+    st.table(COEFF_ROWS)
 
 st.caption("Note: This is a simplified linearized Mundell-Fleming simulation with arbitrary scale for illustrative purposes.")
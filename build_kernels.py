@@ -0,0 +1,47 @@
+# Ahead-of-time build of the numba kernels used by the Streamlit app.
+#
+#     python build_kernels.py
+#
+# writes the mf_kernels extension module next to this file. The app imports it
+# when present, so neither numba nor a JIT compile is paid at startup; otherwise
+# it JIT-compiles the same source below.
+import os
+
+import numpy as np
+
+# Output-equation coefficients. compute_equilibrium in the app imports these
+# too, so the grid kernel and the headline metrics can't drift apart.
+NX_PASS_THROUGH = 0.6  # share of the tariff shock that reaches net exports
+IS_TO_Y = 0.8  # IS shift -> output
+LM_TO_Y = 0.5  # LM shift -> output
+
+# output (Y) grid: float64 tariff shocks, float64 AD drags, then the base output
+# and the fiscal (IS) and monetary (LM) shifts of the chosen policy mix
+GRID_SIG = "f8[:,:](f8[:], f8[:], f8, f8, f8)"
+
+
+# Output across every tariff shock / AD drag pair, same equation as
+# compute_equilibrium in the app. The tariff rows loop over `prange`: plain
+# range by default, numba.prange for the parallel JIT build, so nothing here
+# needs numba until a build asks for it.
+def make_compute_grid(prange=range):
+    def compute_grid(tariff_arr, ad_arr, Y0, fiscal_shift, LM_shift):
+        Y_grid = np.empty((tariff_arr.size, ad_arr.size))
+        for i in prange(tariff_arr.size):
+            net_exports_boost = tariff_arr[i] * NX_PASS_THROUGH
+            for j in range(ad_arr.size):
+                IS_shift = net_exports_boost - ad_arr[j] + fiscal_shift
+                Y_grid[i, j] = Y0 + IS_TO_Y * IS_shift + LM_TO_Y * LM_shift
+        return Y_grid
+    return compute_grid
+
+
+if __name__ == "__main__":
+    # only the build needs pycc, so the app never imports it
+    from numba.pycc import CC
+
+    cc = CC("mf_kernels")
+    cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+    # pycc has no parallel backend, so the AOT build keeps the plain loop
+    cc.export("compute_grid", GRID_SIG)(make_compute_grid())
+    cc.compile()